@@ -1,7 +1,7 @@
 """
 AWS ARN parser
 """
-from typing import List, Tuple, Optional
+from typing import Tuple, Optional
 
 
 class ARN:  # pylint: disable=too-many-instance-attributes,too-few-public-methods
@@ -9,21 +9,44 @@ class ARN:  # pylint: disable=too-many-instance-attributes,too-few-public-method
     AWS ARN parser
     """
 
+    __slots__ = (
+        "full_arn",
+        "arn",
+        "partition",
+        "service",
+        "region",
+        "account",
+        "resource_type",
+        "resource",
+    )
+
+    full_arn: str
+    arn: str
+    partition: str
+    service: str
+    region: str
+    account: str
+    resource_type: Optional[str]
+    resource: str
+
     def __init__(self, arn: str):
         self.full_arn = arn
-        elements = arn.split(":")
-        self.arn = elements[0]
-        self.partition = elements[1]
-        self.service = elements[2]
-        self.region = elements[3]
-        self.account = elements[4]
-        self.resource_type, self.resource = self._get_resource(elements)
+        (
+            self.arn,
+            self.partition,
+            self.service,
+            self.region,
+            self.account,
+            resource,
+        ) = arn.split(":", 5)
+        self.resource_type, self.resource = self._get_resource(resource)
 
     @staticmethod
-    def _get_resource(elements: List[str]) -> Tuple[Optional[str], str]:
-        if len(elements) == 7:
-            return elements[5], elements[6]
-        if "/" not in elements[5]:
-            return None, elements[5]
-        resource = elements[5].split("/", 1)
-        return resource[0], resource[1]
+    def _get_resource(resource: str) -> Tuple[Optional[str], str]:
+        head, sep, tail = resource.partition("/")
+        if ":" in head:
+            resource_type, _, resource_id = resource.partition(":")
+            return resource_type, resource_id
+        if sep:
+            return head, tail
+        return None, head
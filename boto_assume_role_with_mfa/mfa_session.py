@@ -3,24 +3,60 @@ Implementation files for assuming roles using MFA session caching
 """
 import abc
 import datetime
+import functools
 import logging
-from typing import Optional, Tuple
+import os
+import sys
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
 
-import pytz
 from boto3 import Session
 from botocore import credentials
 from botocore.client import BaseClient
-from botocore.credentials import JSONFileCache
 from dateutil.parser import parse
 
+if sys.version_info >= (3, 8):
+    from typing import Protocol
+else:
+    Protocol = object
+
+
+class MutableCacheProtocol(Protocol):
+    """
+    The subset of the JSONFileCache interface used by the SessionCache
+    """
+
+    def __contains__(self, cache_key: Any) -> bool:
+        ...
+
+    def __getitem__(self, cache_key: str) -> Any:
+        ...
+
+    def __setitem__(self, cache_key: str, value: Any) -> None:
+        ...
+
 
 class SessionCache:
     """ This is an internal API not intended for public use """
 
+    REFRESH_SKEW = datetime.timedelta(minutes=5)
+    EXPIRATION_EPOCH_KEY = "_expiration_epoch"
+
     logger = logging.getLogger(__name__)
 
-    def __init__(self, *, cache: JSONFileCache):
+    def __init__(
+        self,
+        *,
+        cache: MutableCacheProtocol,
+        refresh_skew: datetime.timedelta = REFRESH_SKEW,
+    ):
+        """
+        :param cache: the cache used to store sessions
+        :param refresh_skew: how long before expiry a session is treated as expired
+        """
         self._cache = cache
+        self._refresh_skew = refresh_skew
+        self._refresh_skew_seconds = refresh_skew.total_seconds()
 
     def get_session_token(self, *, key: str) -> Optional[dict]:
         """
@@ -35,21 +71,56 @@ class SessionCache:
 
         self.logger.info("Found unexpired session data in cache: %s", key)
 
+        if session_data:
+            # the expiration epoch is internal to the cache, return the session as STS created it
+            session_data = dict(session_data)
+            session_data.pop(self.EXPIRATION_EPOCH_KEY, None)
         return session_data
 
     def _is_expired(self, *, session_data: dict) -> bool:
-        expiration = session_data["Credentials"]["Expiration"]
-        if isinstance(expiration, str):
-            expiration = parse(expiration)
-
-        now = datetime.datetime.now(tz=pytz.utc)
-
-        expired = expiration < now
+        expiration_epoch = session_data.get(self.EXPIRATION_EPOCH_KEY)
+        if expiration_epoch is not None:
+            now_epoch = time.time()
+            expired = expiration_epoch - self._refresh_skew_seconds < now_epoch
+            self.logger.info(
+                "Session expires at %s, currently %s, expired:%s",
+                expiration_epoch,
+                now_epoch,
+                expired,
+            )
+            return expired
+
+        # entries cached before the expiration epoch was recorded
+        expiration = self._get_expiration(session_data=session_data)
+
+        now = datetime.datetime.now(tz=datetime.timezone.utc)
+
+        expired = expiration - self._refresh_skew < now
         self.logger.info(
             "Session expires at %s, currently %s, expired:%s", expiration, now, expired
         )
         return expired
 
+    @classmethod
+    def _get_expiration(cls, *, session_data: dict) -> datetime.datetime:
+        expiration = session_data["Credentials"]["Expiration"]
+        if isinstance(expiration, str):
+            expiration = cls._parse_expiration(expiration)
+        return expiration
+
+    @staticmethod
+    def _parse_expiration(expiration: str) -> datetime.datetime:
+        # JSONFileCache writes expirations as "%Y-%m-%dT%H:%M:%S%Z", e.g. 2020-10-01T17:08:49UTC
+        for suffix in ("UTC", "Z"):
+            if expiration.endswith(suffix):
+                expiration = expiration[: -len(suffix)] + "+00:00"
+                break
+        try:
+            return datetime.datetime.fromisoformat(expiration)
+        except (AttributeError, ValueError):
+            # fromisoformat is unavailable before python 3.7 and rejects some other formats
+            return parse(expiration)
+
     def _get_cached_session(self, *, key: str) -> Optional[dict]:
         try:
             return self._cache[key]
@@ -63,7 +134,67 @@ class SessionCache:
         :param data: the session data to cache
         :return: None
         """
-        self._cache[key] = data
+        expiration = self._get_expiration(session_data=data)
+        self._cache[key] = dict(
+            data, **{self.EXPIRATION_EPOCH_KEY: int(expiration.timestamp())}
+        )
+
+
+class BoundedJSONFileCache(credentials.JSONFileCache):
+    """
+    A JSONFileCache which removes the least recently written entries once it holds more than
+    max_entries. Its directory must only be used by this cache, by default a subdirectory of
+    the botocore cache owned by this package.
+    """
+
+    # pylint: disable=too-few-public-methods
+    CACHE_DIR = os.path.join(
+        credentials.JSONFileCache.CACHE_DIR, "boto_assume_role_with_mfa"
+    )
+    MAX_ENTRIES = 256
+
+    logger = logging.getLogger(__name__)
+
+    def __init__(
+        self,
+        working_dir: str = CACHE_DIR,
+        *,
+        max_entries: int = MAX_ENTRIES,
+    ):
+        """
+        :param working_dir: the directory in which the cache files are stored
+        :param max_entries: the number of entries to keep
+        """
+        super().__init__(working_dir=working_dir)
+        self._cache_dir = working_dir
+        self._max_entries = max_entries
+
+    def __setitem__(self, cache_key, value):
+        super().__setitem__(cache_key, value)
+        self._evict(keep=cache_key)
+
+    def _evict(self, *, keep: str):
+        keep_name = os.path.basename(self._convert_cache_key(keep))
+        with os.scandir(self._cache_dir) as entries:
+            cache_files = [
+                entry
+                for entry in entries
+                if entry.is_file()
+                and entry.name.endswith(".json")
+                and entry.name != keep_name
+            ]
+        # the entry just written is kept, so max_entries - 1 of the others remain
+        excess = len(cache_files) - (self._max_entries - 1)
+        if excess <= 0:
+            return
+
+        cache_files.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in cache_files[:excess]:
+            self.logger.info("Evicting %s from session cache", entry.name)
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
 
 
 def _get_account_and_user(*, sts_client: BaseClient) -> Tuple[str, str]:
@@ -73,52 +204,99 @@ def _get_account_and_user(*, sts_client: BaseClient) -> Tuple[str, str]:
     return identity["Account"], arn.split("/")[-1]
 
 
+def _prompt_for_mfa_code() -> str:
+    """ This is an internal API not intended for public use """
+    return input("MFA code:")
+
+
 class CachedMfaSessionFactory:
     """ This is an internal API not intended for public use """
 
     # pylint: disable=too-few-public-methods
     SESSION_KEY = "temporary_session"
     MFA_SESSION_DURATION = datetime.timedelta(hours=12)
+    MFA_SESSION_DURATION_SECONDS = int(MFA_SESSION_DURATION.total_seconds())
 
     logger = logging.getLogger(__name__)
 
-    def __init__(self, *, sts_client: BaseClient, session_cache: SessionCache):
+    def __init__(
+        self,
+        *,
+        sts_client: BaseClient,
+        session_cache: SessionCache,
+        prompter: Callable[[], str] = _prompt_for_mfa_code,
+    ):
+        """
+        :param sts_client: the STS client of the base session
+        :param session_cache: the cache for the temporary session
+        :param prompter: called to obtain an MFA code when none is supplied
+        """
         self._sts_client = sts_client
         self._session_cache = session_cache
+        self._prompter = prompter
+        self._mfa_serial: Optional[str] = None
 
-    def get_session_token(self, *, mfa_token: Optional[str] = None) -> dict:
+    def get_session_token(
+        self,
+        *,
+        mfa_token: Optional[str] = None,
+        prompter: Optional[Callable[[], str]] = None,
+    ) -> dict:
         """
         It will use STS to get a new session token, or use a previously cached token if one is
         available.
 
         :param mfa_token: if you do not specify the mfa token, this method will prompt for it
+        :param prompter: used instead of the factory's prompter to obtain the MFA code
         :return: temporary credentials for a new session as created by the sts GetSessionToken api
         """
         session_data = self._session_cache.get_session_token(key=self.SESSION_KEY)
         if session_data:
             return session_data
-        return self._create_session(mfa_token=mfa_token)
+        return self._create_session(mfa_token=mfa_token, prompter=prompter)
 
-    def _create_session(self, *, mfa_token: Optional[str] = None) -> dict:
+    def _create_session(
+        self,
+        *,
+        mfa_token: Optional[str] = None,
+        prompter: Optional[Callable[[], str]] = None,
+    ) -> dict:
         if not mfa_token:
             self.logger.info("No session for:%s, prompt for MFA", self.SESSION_KEY)
-            mfa_token = input("MFA code:")
+            mfa_token = (prompter or self._prompter)()
 
-        account, user = _get_account_and_user(sts_client=self._sts_client)
         session_data = self._sts_client.get_session_token(
-            DurationSeconds=CachedMfaSessionFactory.MFA_SESSION_DURATION.seconds,
-            SerialNumber=f"arn:aws:iam::{account}:mfa/{user}",
+            DurationSeconds=self.MFA_SESSION_DURATION_SECONDS,
+            SerialNumber=self._get_mfa_serial(),
             TokenCode=mfa_token,
         )
         self._session_cache.cache_session(key=self.SESSION_KEY, data=session_data)
         return session_data
 
+    def _get_mfa_serial(self) -> str:
+        if self._mfa_serial is None:
+            account, user = _get_account_and_user(sts_client=self._sts_client)
+            self._mfa_serial = f"arn:aws:iam::{account}:mfa/{user}"
+        return self._mfa_serial
+
+
+@functools.lru_cache(maxsize=None)
+def _get_session_factory(*, profile_name: str) -> CachedMfaSessionFactory:
+    """ This is an internal API not intended for public use """
+    session = Session(profile_name=profile_name)
+    session_cache = SessionCache(cache=BoundedJSONFileCache())
+    return CachedMfaSessionFactory(
+        sts_client=session.client("sts"), session_cache=session_cache
+    )
+
 
 class SessionProvider:
     """
     Interface for session providers
     """
 
+    __slots__ = ()
+
     @property
     @abc.abstractmethod
     def temporary_credentials(self) -> dict:
@@ -170,27 +348,51 @@ class MFASessionProvider(SessionProvider):
     Uses a base session to provide assume role credentials with cached MFA
     """
 
+    __slots__ = (
+        "_session_data",
+        "_credentials",
+        "_session_by_region",
+        "_sts_by_region",
+    )
+
     logger = logging.getLogger(__name__)
 
     ASSUME_ROLE_SESSION_DURATION = datetime.timedelta(hours=1)
 
     def __init__(self, *, session_data: dict):
         self._session_data = session_data
+        self._credentials = session_data["Credentials"]
+        self._session_by_region: Dict[str, Session] = {}
+        self._sts_by_region: Dict[str, BaseClient] = {}
 
     @property
     def temporary_credentials(self) -> dict:
         """
         :return: the credentials in use by the base session
         """
-        return self._session_data["Credentials"]
+        return self._credentials
 
     def _create_temporary_session(self, *, region_name: str) -> Session:
-        return self._get_session_from(
-            aws_access_key_id=self._session_data["Credentials"]["AccessKeyId"],
-            aws_secret_access_key=self._session_data["Credentials"]["SecretAccessKey"],
-            aws_session_token=self._session_data["Credentials"]["SessionToken"],
-            region_name=region_name,
-        )
+        session = self._session_by_region.get(region_name)
+        if session is None:
+            temporary_credentials = self._credentials
+            session = self._get_session_from(
+                aws_access_key_id=temporary_credentials["AccessKeyId"],
+                aws_secret_access_key=temporary_credentials["SecretAccessKey"],
+                aws_session_token=temporary_credentials["SessionToken"],
+                region_name=region_name,
+            )
+            self._session_by_region[region_name] = session
+        return session
+
+    def _get_temporary_sts_client(self, *, region_name: str) -> BaseClient:
+        sts_client = self._sts_by_region.get(region_name)
+        if sts_client is None:
+            sts_client = self._create_temporary_session(region_name=region_name).client(
+                "sts"
+            )
+            self._sts_by_region[region_name] = sts_client
+        return sts_client
 
     def assume_role_credentials(
         self, *, role_arn: str, region_name: str, session_name: str
@@ -204,9 +406,7 @@ class MFASessionProvider(SessionProvider):
 
         :return: the credentials of the new session
         """
-        temp_sts_client = self._create_temporary_session(
-            region_name=region_name
-        ).client("sts")
+        temp_sts_client = self._get_temporary_sts_client(region_name=region_name)
 
         session_data = temp_sts_client.assume_role(
             RoleArn=role_arn,
@@ -242,9 +442,7 @@ class MFASessionProvider(SessionProvider):
         """
         :return: the user name of the user who owns the base session
         """
-        temp_sts_client = self._create_temporary_session(
-            region_name="eu-west-1"
-        ).client("sts")
+        temp_sts_client = self._get_temporary_sts_client(region_name="eu-west-1")
         return _get_account_and_user(sts_client=temp_sts_client)[1]
 
     @staticmethod
@@ -252,34 +450,29 @@ class MFASessionProvider(SessionProvider):
         *,
         aws_access_key_id: str,
         aws_secret_access_key: str,
-        aws_session_token: str = None,
-        region_name: str = None,
+        aws_session_token: Optional[str] = None,
+        region_name: Optional[str] = None,
     ) -> Session:
-        session_properties = {
-            "aws_access_key_id": aws_access_key_id,
-            "aws_secret_access_key": aws_secret_access_key,
-        }
-        if aws_session_token:
-            session_properties["aws_session_token"] = aws_session_token
-        if region_name:
-            session_properties["region_name"] = region_name
-
-        return Session(**session_properties)
+        return Session(
+            aws_access_key_id=aws_access_key_id,
+            aws_secret_access_key=aws_secret_access_key,
+            aws_session_token=aws_session_token,
+            region_name=region_name,
+        )
 
     @staticmethod
-    def create(*, profile_name: str):
+    def create(*, profile_name: str, prompter: Optional[Callable[[], str]] = None):
         """
         Create a new session provider with MFA authentication, that you can use to create temporary
         assume role sessions for roles that are protected by policies requiring MFA
 
         :param profile_name: the profile to use to create the base session
+        :param prompter: called to obtain an MFA code, by default the code is read from stdin
 
         :return: the SessionProvider
         """
-        session = Session(profile_name=profile_name)
-        session_cache = SessionCache(cache=credentials.JSONFileCache())
-        session_factory = CachedMfaSessionFactory(
-            sts_client=session.client("sts"), session_cache=session_cache
-        )
+        session_factory = _get_session_factory(profile_name=profile_name)
 
-        return MFASessionProvider(session_data=session_factory.get_session_token())
+        return MFASessionProvider(
+            session_data=session_factory.get_session_token(prompter=prompter)
+        )
@@ -1,6 +1,10 @@
 """
 Implementation files for assuming roles using SSO session
 """
+import datetime
+import time
+from typing import Dict, Optional, Tuple
+
 from aws_sso_lib import list_available_roles, get_boto3_session
 from boto3 import Session
 
@@ -13,6 +17,8 @@ class SSOSessionProvider(SessionProvider):
     SessionProvider which uses an SSO session
     """
 
+    SESSION_CACHE_DURATION = datetime.timedelta(minutes=50)
+
     @property
     def temporary_credentials(self) -> dict:
         raise NotImplementedError("SSO session uses token, not credentials")
@@ -20,6 +26,9 @@ class SSOSessionProvider(SessionProvider):
     def __init__(self, *, start_url: str, sso_region: str):
         self._start_url = start_url
         self._sso_region = sso_region
+        self._any_role: Optional[ARN] = None
+        self._user: Optional[str] = None
+        self._session_cache: Dict[Tuple[str, str], Tuple[Session, float]] = {}
 
     def assume_role_session(
         self,
@@ -31,14 +40,23 @@ class SSOSessionProvider(SessionProvider):
         """
         Assume a role using the SSO session and return the credentials
 
+        Sessions are cached per role and region for SESSION_CACHE_DURATION, so repeated calls
+        return the same boto3 Session. boto3 Sessions are not thread safe, so create a separate
+        SSOSessionProvider for each thread that needs one.
+
         :param role_arn: the role to assume
         :param region_name: the region you will use
         :param session_name: a session name (unused)
 
         :return: the credentials of the new session
         """
+        key = (role_arn, region_name)
+        cached = self._session_cache.get(key)
+        if cached is not None and cached[1] > time.time():
+            return cached[0]
+
         arn = ARN(role_arn)
-        return get_boto3_session(
+        session = get_boto3_session(
             start_url=self._start_url,
             sso_region=self._sso_region,
             account_id=arn.account,
@@ -46,6 +64,11 @@ class SSOSessionProvider(SessionProvider):
             region=region_name,
             login=True,
         )
+        self._session_cache[key] = (
+            session,
+            time.time() + self.SESSION_CACHE_DURATION.total_seconds(),
+        )
+        return session
 
     def assume_role_credentials(
         self, *, role_arn: str, region_name: str, session_name: str
@@ -71,13 +94,24 @@ class SSOSessionProvider(SessionProvider):
         return temp_credentials
 
     def _get_any_role(self) -> ARN:
-        for role in list_available_roles(
-            sso_region=self._sso_region,
-            start_url=self._start_url,
-            login=True,
-        ):
-            return ARN(f"arn:aws:iam::{role[0]}:role/{role[2]}")
-        raise Exception("No accessible roles found")
+        if self._any_role is None:
+            self._any_role = self._find_any_role()
+        return self._any_role
+
+    def _find_any_role(self) -> ARN:
+        # list_available_roles pages through accounts and roles lazily, so taking the
+        # first role only fetches the first page of each
+        role = next(
+            list_available_roles(
+                sso_region=self._sso_region,
+                start_url=self._start_url,
+                login=True,
+            ),
+            None,
+        )
+        if role is None:
+            raise Exception("No accessible roles found")
+        return ARN(f"arn:aws:iam::{role[0]}:role/{role[2]}")
 
     def get_user(self) -> str:
         """
@@ -85,6 +119,11 @@ class SSOSessionProvider(SessionProvider):
         `get_caller_identity()`
         :return: The SSO user name
         """
+        if self._user is None:
+            self._user = self._find_user()
+        return self._user
+
+    def _find_user(self) -> str:
         role = self._get_any_role()
         session = self.assume_role_session(
             role_arn=role.full_arn, region_name="eu-west-1", session_name="test"
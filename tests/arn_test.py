@@ -22,3 +22,10 @@ class ARNTest(unittest.TestCase):
         self.assertEqual(role_arn.account, "123456789012")
         self.assertEqual(role_arn.resource_type, "role")
         self.assertEqual(role_arn.resource, "common-roles/developer")
+
+    def test_arn_without_resource_type(self):
+        bucket_arn = ARN("arn:aws:s3:::example-bucket")
+        self.assertEqual(bucket_arn.service, "s3")
+        self.assertEqual(bucket_arn.account, "")
+        self.assertIsNone(bucket_arn.resource_type)
+        self.assertEqual(bucket_arn.resource, "example-bucket")
@@ -1,18 +1,22 @@
 import datetime
+import os
+import tempfile
 import unittest
-from unittest.mock import Mock
+from unittest.mock import Mock, patch
 
 import pytz
 from botocore.client import BaseClient
 from botocore.credentials import JSONFileCache
 
-from boto_assume_role_with_mfa.mfa_session import SessionCache, CachedMfaSessionFactory
+from boto_assume_role_with_mfa.mfa_session import (
+    BoundedJSONFileCache, SessionCache, CachedMfaSessionFactory, MFASessionProvider,
+    _get_session_factory
+)
 
 
-class InMemoryCache(JSONFileCache):
+class InMemoryCache:
 
     def __init__(self):
-        super().__init__()
         self._cache = {}
 
     def __contains__(self, cache_key):
@@ -56,6 +60,14 @@ class SessionCacheTest(unittest.TestCase):
 
         self.assertIsNone(session_cache.get_session_token(key="key"))
 
+    def test_cache_manager_unreadable_entry(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            with open(os.path.join(cache_dir, "key.json"), "w") as cache_file:
+                cache_file.write("{")
+            session_cache = SessionCache(cache=JSONFileCache(cache_dir))
+
+            self.assertIsNone(session_cache.get_session_token(key="key"))
+
     def test_cache_manager_warm(self):
         cache = InMemoryCache()
         session_data = SESSION_DATA
@@ -69,6 +81,83 @@ class SessionCacheTest(unittest.TestCase):
 
         self.assertIsNotNone(session_cache.get_session_token(key="key"))
 
+    @patch("boto_assume_role_with_mfa.mfa_session.parse")
+    def test_cache_manager_json_file_cache_expiration(self, parse):
+        cache = InMemoryCache()
+        session_data = dict(SESSION_DATA)
+
+        now = datetime.datetime.now(tz=pytz.utc)
+        session_data['Credentials'] = dict(
+            SESSION_DATA['Credentials'],
+            Expiration=(now - datetime.timedelta(hours=1)).strftime("%Y-%m-%dT%H:%M:%S%Z")
+        )
+        cache.__setitem__("key", session_data)
+        session_cache = SessionCache(cache=cache)
+
+        self.assertIsNone(session_cache.get_session_token(key="key"))
+        parse.assert_not_called()
+
+    def test_cache_manager_within_refresh_skew(self):
+        cache = InMemoryCache()
+        session_data = dict(SESSION_DATA)
+
+        now = datetime.datetime.now(tz=pytz.utc)
+        session_data['Credentials'] = dict(
+            SESSION_DATA['Credentials'],
+            Expiration=(now + datetime.timedelta(minutes=2)).isoformat()
+        )
+        cache.__setitem__("key", session_data)
+
+        self.assertIsNone(SessionCache(cache=cache).get_session_token(key="key"))
+        self.assertIsNotNone(
+            SessionCache(
+                cache=cache, refresh_skew=datetime.timedelta(0)
+            ).get_session_token(key="key")
+        )
+
+    def test_cache_session_records_expiration_epoch(self):
+        cache = InMemoryCache()
+        session_cache = SessionCache(cache=cache)
+
+        session_cache.cache_session(key="key", data=get_current_session_data())
+
+        self.assertIn(SessionCache.EXPIRATION_EPOCH_KEY, cache["key"])
+        self.assertNotIn(
+            SessionCache.EXPIRATION_EPOCH_KEY, session_cache.get_session_token(key="key")
+        )
+
+        cache["key"][SessionCache.EXPIRATION_EPOCH_KEY] = 0
+        self.assertIsNone(session_cache.get_session_token(key="key"))
+
+
+class BoundedJSONFileCacheTest(unittest.TestCase):
+
+    def test_oldest_entry_is_evicted(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache = BoundedJSONFileCache(cache_dir, max_entries=2)
+            cache["oldest"] = {"key": "oldest"}
+            cache["newer"] = {"key": "newer"}
+            os.utime(os.path.join(cache_dir, "oldest.json"), (100, 100))
+            os.utime(os.path.join(cache_dir, "newer.json"), (200, 200))
+
+            cache["latest"] = {"key": "latest"}
+
+            self.assertNotIn("oldest", cache)
+            self.assertIn("newer", cache)
+            self.assertEqual(cache["latest"], {"key": "latest"})
+
+    def test_written_entry_is_never_evicted(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache = BoundedJSONFileCache(cache_dir, max_entries=1)
+            cache["existing"] = {"key": "existing"}
+            future = datetime.datetime.now().timestamp() + 3600
+            os.utime(os.path.join(cache_dir, "existing.json"), (future, future))
+
+            cache["latest"] = {"key": "latest"}
+
+            self.assertNotIn("existing", cache)
+            self.assertEqual(cache["latest"], {"key": "latest"})
+
 
 def get_current_session_data() -> dict:
     session_data = SESSION_DATA
@@ -119,3 +208,89 @@ class CachedMfaSessionFactoryTest(unittest.TestCase):
         )
 
         self.assertIsNotNone(cached_mfa_session_factory.get_session_token())
+
+    def test_caller_identity_is_cached(self):
+        sts_client = Mock(BaseClient)
+        sts_client.get_caller_identity = Mock(
+            return_value={'Arn': 'arn:aws:iam::123456789012:user/fred', 'Account': '123456789012'}
+        )
+        sts_client.get_session_token = Mock(return_value=get_current_session_data())
+
+        cached_mfa_session_factory = CachedMfaSessionFactory(
+            sts_client=sts_client,
+            session_cache=SessionCache(cache=InMemoryCache()))
+
+        cached_mfa_session_factory._create_session(mfa_token="token")
+        cached_mfa_session_factory._create_session(mfa_token="token")
+
+        sts_client.get_caller_identity.assert_called_once()
+        sts_client.get_session_token.assert_called_with(
+            DurationSeconds=43200,
+            SerialNumber="arn:aws:iam::123456789012:mfa/fred",
+            TokenCode="token"
+        )
+
+    def test_mfa_code_from_prompter(self):
+        sts_client = Mock(BaseClient)
+        sts_client.get_caller_identity = Mock(
+            return_value={'Arn': 'arn:aws:iam::123456789012:user/fred', 'Account': '123456789012'}
+        )
+        sts_client.get_session_token = Mock(return_value=get_current_session_data())
+
+        cached_mfa_session_factory = CachedMfaSessionFactory(
+            sts_client=sts_client,
+            session_cache=SessionCache(cache=InMemoryCache()),
+            prompter=lambda: "123456")
+        cached_mfa_session_factory.get_session_token()
+
+        self.assertEqual(sts_client.get_session_token.call_args[1]["TokenCode"], "123456")
+
+
+class MFASessionProviderTest(unittest.TestCase):
+
+    @patch("boto_assume_role_with_mfa.mfa_session.Session")
+    def test_temporary_sts_client_reused_per_region(self, session_class):
+        session_class.return_value.client.return_value.assume_role = Mock(
+            return_value=get_current_session_data()
+        )
+        provider = MFASessionProvider(session_data=get_current_session_data())
+
+        for _ in range(2):
+            provider.assume_role_credentials(
+                role_arn="arn:aws:iam::123456789012:role/demo",
+                region_name="eu-west-1",
+                session_name="test"
+            )
+
+        session_class.assert_called_once()
+        session_class.return_value.client.assert_called_once_with("sts")
+
+    @patch("boto_assume_role_with_mfa.mfa_session.BoundedJSONFileCache")
+    @patch("boto_assume_role_with_mfa.mfa_session.Session")
+    def test_create_reuses_session_factory_per_profile(self, session_class, file_cache_class):
+        cache = InMemoryCache()
+        cache.__setitem__(CachedMfaSessionFactory.SESSION_KEY, get_current_session_data())
+        file_cache_class.return_value = cache
+        _get_session_factory.cache_clear()
+        self.addCleanup(_get_session_factory.cache_clear)
+
+        MFASessionProvider.create(profile_name="example")
+        MFASessionProvider.create(profile_name="example")
+
+        session_class.assert_called_once_with(profile_name="example")
+
+    @patch("boto_assume_role_with_mfa.mfa_session.BoundedJSONFileCache")
+    @patch("boto_assume_role_with_mfa.mfa_session.Session")
+    def test_create_uses_prompter(self, session_class, file_cache_class):
+        file_cache_class.return_value = InMemoryCache()
+        sts_client = session_class.return_value.client.return_value
+        sts_client.get_caller_identity = Mock(
+            return_value={'Arn': 'arn:aws:iam::123456789012:user/fred', 'Account': '123456789012'}
+        )
+        sts_client.get_session_token = Mock(return_value=get_current_session_data())
+        _get_session_factory.cache_clear()
+        self.addCleanup(_get_session_factory.cache_clear)
+
+        MFASessionProvider.create(profile_name="example", prompter=lambda: "123456")
+
+        self.assertEqual(sts_client.get_session_token.call_args[1]["TokenCode"], "123456")
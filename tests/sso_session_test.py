@@ -0,0 +1,52 @@
+import unittest
+from unittest.mock import Mock, patch
+
+from boto_assume_role_with_mfa.sso_session import SSOSessionProvider
+
+ROLE_ARN = "arn:aws:iam::123456789012:role/developer"
+
+
+class SSOSessionProviderTest(unittest.TestCase):
+
+    @patch("boto_assume_role_with_mfa.sso_session.get_boto3_session")
+    def test_assume_role_session_is_cached(self, get_boto3_session):
+        provider = SSOSessionProvider(start_url="https://example.com/start", sso_region="eu-west-1")
+
+        first = provider.assume_role_session(
+            role_arn=ROLE_ARN, region_name="eu-west-1", session_name="test"
+        )
+        second = provider.assume_role_session(
+            role_arn=ROLE_ARN, region_name="eu-west-1", session_name="test"
+        )
+        provider.assume_role_session(
+            role_arn=ROLE_ARN, region_name="us-east-1", session_name="test"
+        )
+
+        self.assertIs(first, second)
+        self.assertEqual(get_boto3_session.call_count, 2)
+        get_boto3_session.assert_any_call(
+            start_url="https://example.com/start",
+            sso_region="eu-west-1",
+            account_id="123456789012",
+            role_name="developer",
+            region="eu-west-1",
+            login=True,
+        )
+
+    @patch("boto_assume_role_with_mfa.sso_session.list_available_roles")
+    @patch("boto_assume_role_with_mfa.sso_session.get_boto3_session")
+    def test_get_user_is_cached(self, get_boto3_session, list_available_roles):
+        list_available_roles.side_effect = lambda **_: iter(
+            [("123456789012", "example", "developer")]
+        )
+        sts_client = get_boto3_session.return_value.client.return_value
+        sts_client.get_caller_identity = Mock(
+            return_value={"UserId": "AROAEXAMPLE:fred@example.com"}
+        )
+        provider = SSOSessionProvider(start_url="https://example.com/start", sso_region="eu-west-1")
+
+        self.assertEqual(provider.get_user(), "fred@example.com")
+        self.assertEqual(provider.get_user(), "fred@example.com")
+
+        list_available_roles.assert_called_once()
+        sts_client.get_caller_identity.assert_called_once()